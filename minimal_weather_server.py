@@ -7,9 +7,52 @@ import asyncio
 import json
 import sys
 import os
-import urllib.request
-import urllib.parse
-from typing import Dict, Any, Optional
+import stat
+from typing import Dict, Any, Optional, Union
+
+from weather_api import WeatherClient
+from weather_utils import dumps as _dumps, loads as _loads
+
+TOOLS = [
+    {
+        "name": "get_weather",
+        "description": "Get current weather for a location",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'London', 'New York')"
+                }
+            },
+            "required": ["location"]
+        }
+    },
+    {
+        "name": "get_weather_forecast",
+        "description": "Get 5-day weather forecast for a location",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'London', 'New York')"
+                },
+                "days": {
+                    "type": "number",
+                    "description": "Number of days to forecast (1-5)",
+                    "minimum": 1,
+                    "maximum": 5,
+                    "default": 5
+                }
+            },
+            "required": ["location"]
+        }
+    }
+]
+
+# tools/list never changes, so its result is serialized once at import
+_TOOLS_LIST_TAIL = _dumps({"result": {"tools": TOOLS}})[1:]
 
 class MCPWeatherServer:
     def __init__(self):
@@ -17,322 +60,272 @@ class MCPWeatherServer:
             "name": "weather-server",
             "version": "1.0.0"
         }
+        self.weather = WeatherClient()
+        
+        # Method and tool dispatch tables
+        self._dispatch = {
+            "initialize": self._h_init,
+            "notifications/initialized": self._h_notif_initialized,
+            "tools/list": self._h_tools_list,
+            "tools/call": self._h_tools_call
+        }
+        self._tools = {
+            "get_weather": self._t_weather,
+            "get_weather_forecast": self._t_forecast
+        }
+        
+        # The initialize result is serialized once; only the request id varies.
+        # The leading '{' is dropped so the tail can follow a spliced-in id.
+        self._init_tail = _dumps({
+            "result": {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {
+                    "tools": {}
+                },
+                "serverInfo": self.server_info
+            }
+        })[1:]
+    
+    async def aclose(self):
+        """Release the weather client's resources"""
+        await self.weather.aclose()
         
-    async def handle_message(self, message: str) -> Optional[str]:
+    def _splice(self, request_id: Any, tail: bytes) -> bytes:
+        """Build a response from a pre-serialized result tail"""
+        return b'{"jsonrpc":"2.0","id":' + _dumps(request_id) + b"," + tail
+    
+    async def handle_message(self, message: Union[str, bytes]) -> Optional[bytes]:
         """Handle incoming JSON-RPC message"""
         try:
-            data = json.loads(message.strip())
+            data = _loads(message.strip())
             response = await self.process_request(data)
-            return json.dumps(response) if response else None
+            if isinstance(response, bytes):
+                return response
+            return _dumps(response) if response else None
         except json.JSONDecodeError:
-            return json.dumps({
+            return _dumps({
                 "jsonrpc": "2.0",
                 "id": None,
                 "error": {"code": -32700, "message": "Parse error"}
             })
         except Exception as e:
-            return json.dumps({
+            return _dumps({
                 "jsonrpc": "2.0", 
                 "id": data.get("id"),
                 "error": {"code": -32603, "message": f"Internal error: {str(e)}"}
             })
     
-    async def process_request(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def process_request(self, data: Dict[str, Any]) -> Optional[Union[Dict[str, Any], bytes]]:
         """Process JSON-RPC request"""
         method = data.get("method")
         params = data.get("params", {})
         request_id = data.get("id")
         
-        if method == "initialize":
+        handler = self._dispatch.get(method)
+        if handler is None:
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
-                "result": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {}
-                    },
-                    "serverInfo": self.server_info
+                "error": {
+                    "code": -32601,
+                    "message": f"Unknown method: {method}"
                 }
             }
+        return await handler(request_id, params)
+    
+    async def _h_init(self, request_id: Any, params: Dict[str, Any]) -> bytes:
+        """Handle initialize"""
+        return self._splice(request_id, self._init_tail)
+    
+    async def _h_notif_initialized(self, request_id: Any, params: Dict[str, Any]) -> None:
+        """Handle notifications/initialized"""
+        # Notification - no response needed
+        return None
+    
+    async def _h_tools_list(self, request_id: Any, params: Dict[str, Any]) -> bytes:
+        """Handle tools/list"""
+        return self._splice(request_id, _TOOLS_LIST_TAIL)
+    
+    async def _h_tools_call(self, request_id: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle tools/call"""
+        tool_name = params.get("name")
+        arguments = params.get("arguments", {})
         
-        elif method == "notifications/initialized":
-            # Notification - no response needed
-            return None
-        
-        elif method == "tools/list":
+        tool = self._tools.get(tool_name)
+        if tool is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32601,
+                    "message": f"Unknown tool: {tool_name}"
+                }
+            }
+        return await tool(request_id, arguments)
+    
+    async def _t_weather(self, request_id: Any, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the get_weather tool"""
+        try:
+            weather_data = await self.weather.current(arguments.get("location", ""))
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "result": {
-                    "tools": [
-                        {
-                            "name": "get_weather",
-                            "description": "Get current weather for a location",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "location": {
-                                        "type": "string",
-                                        "description": "City name (e.g., 'London', 'New York')"
-                                    }
-                                },
-                                "required": ["location"]
-                            }
-                        },
+                    "content": [
                         {
-                            "name": "get_weather_forecast",
-                            "description": "Get 5-day weather forecast for a location",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "location": {
-                                        "type": "string",
-                                        "description": "City name (e.g., 'London', 'New York')"
-                                    },
-                                    "days": {
-                                        "type": "number",
-                                        "description": "Number of days to forecast (1-5)",
-                                        "minimum": 1,
-                                        "maximum": 5,
-                                        "default": 5
-                                    }
-                                },
-                                "required": ["location"]
-                            }
+                            "type": "text",
+                            "text": weather_data
                         }
                     ]
                 }
             }
-        
-        elif method == "tools/call":
-            tool_name = params.get("name")
-            arguments = params.get("arguments", {})
-            
-            if tool_name == "get_weather":
-                try:
-                    weather_data = await self.get_weather(arguments.get("location", ""))
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": weather_data
-                                }
-                            ]
-                        }
-                    }
-                except Exception as e:
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32603,
-                            "message": f"Weather API error: {str(e)}"
-                        }
-                    }
-            elif tool_name == "get_weather_forecast":
-                try:
-                    forecast_data = await self.get_weather_forecast(
-                        arguments.get("location", ""),
-                        arguments.get("days", 5)
-                    )
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "result": {
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": forecast_data
-                                }
-                            ]
-                        }
-                    }
-                except Exception as e:
-                    return {
-                        "jsonrpc": "2.0",
-                        "id": request_id,
-                        "error": {
-                            "code": -32603,
-                            "message": f"Forecast API error: {str(e)}"
-                        }
-                    }
-            else:
-                return {
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "error": {
-                        "code": -32601,
-                        "message": f"Unknown tool: {tool_name}"
-                    }
-                }
-        
-        else:
+        except Exception as e:
             return {
                 "jsonrpc": "2.0",
                 "id": request_id,
                 "error": {
-                    "code": -32601,
-                    "message": f"Unknown method: {method}"
+                    "code": -32603,
+                    "message": f"Weather API error: {str(e)}"
                 }
             }
     
-    async def get_weather(self, location: str) -> str:
-        """Get weather data from OpenWeatherMap"""
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        
-        if not api_key:
-            return "❌ Error: OPENWEATHER_API_KEY environment variable not set"
-        
-        if not location:
-            return "❌ Error: No location provided"
-        
+    async def _t_forecast(self, request_id: Any, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the get_weather_forecast tool"""
         try:
-            # Build API URL
-            base_url = "https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "q": location,
-                "appid": api_key,
-                "units": "metric"
+            forecast_data = await self.weather.forecast(
+                arguments.get("location", ""),
+                arguments.get("days", 5)
+            )
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "result": {
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": forecast_data
+                        }
+                    ]
+                }
             }
-            url = f"{base_url}?{urllib.parse.urlencode(params)}"
-            
-            # Make API request
-            with urllib.request.urlopen(url) as response:
-                if response.status != 200:
-                    return f"❌ Error: Weather API returned status {response.status}"
-                
-                weather_data = json.loads(response.read().decode())
-            
-            # Format weather information
-            city = weather_data["name"]
-            country = weather_data["sys"]["country"]
-            temp = weather_data["main"]["temp"]
-            feels_like = weather_data["main"]["feels_like"]
-            humidity = weather_data["main"]["humidity"]
-            pressure = weather_data["main"]["pressure"]
-            description = weather_data["weather"][0]["description"].title()
-            wind_speed = weather_data["wind"]["speed"]
-            
-            weather_report = f"""🌤️ Weather Report for {city}, {country}
-
-🌡️ Temperature: {temp}°C (feels like {feels_like}°C)
-☁️ Conditions: {description}
-💧 Humidity: {humidity}%
-🌪️ Wind Speed: {wind_speed} m/s
-📊 Pressure: {pressure} hPa"""
-            
-            return weather_report
-            
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                return f"❌ Error: Location '{location}' not found"
-            else:
-                return f"❌ Error: HTTP {e.code} - {e.reason}"
         except Exception as e:
-            return f"❌ Error: {str(e)}"
+            return {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "error": {
+                    "code": -32603,
+                    "message": f"Forecast API error: {str(e)}"
+                }
+            }
+
+def _stdin_is_pipe() -> bool:
+    """Check whether stdin can be registered with the event loop"""
+    if sys.platform == "win32":
+        return False
+    mode = os.fstat(sys.stdin.fileno()).st_mode
+    return stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode)
+
+# Longest JSON-RPC line accepted from a stdin pipe; longer ones get a parse error
+MAX_LINE = 16 * 1024 * 1024
+
+async def _discard_line(reader: asyncio.StreamReader, consumed: int):
+    """Drop the rest of an over-long line, up to and including its newline"""
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+async def read_lines():
+    """Yield raw lines from stdin without blocking the event loop.
     
-    async def get_weather_forecast(self, location: str, days: int = 5) -> str:
-        """Get weather forecast from OpenWeatherMap"""
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        
-        if not api_key:
-            return "❌ Error: OPENWEATHER_API_KEY environment variable not set"
-        
-        if not location:
-            return "❌ Error: No location provided"
-        
+    None is yielded in place of a line longer than MAX_LINE.
+    """
+    loop = asyncio.get_running_loop()
+    
+    if not _stdin_is_pipe():
+        # Files, ttys and Windows handles are read from a worker thread
+        while line := await loop.run_in_executor(None, sys.stdin.buffer.readline):
+            yield line
+        return
+    
+    reader = asyncio.StreamReader(limit=MAX_LINE)
+    protocol = asyncio.StreamReaderProtocol(reader)
+    await loop.connect_read_pipe(lambda: protocol, sys.stdin)
+    
+    while True:
         try:
-            # Build API URL for forecast
-            base_url = "https://api.openweathermap.org/data/2.5/forecast"
-            params = {
-                "q": location,
-                "appid": api_key,
-                "units": "metric"
-            }
-            url = f"{base_url}?{urllib.parse.urlencode(params)}"
-            
-            # Make API request
-            with urllib.request.urlopen(url) as response:
-                if response.status != 200:
-                    return f"❌ Error: Weather API returned status {response.status}"
-                
-                forecast_data = json.loads(response.read().decode())
-            
-            # Format forecast information
-            city = forecast_data["city"]["name"]
-            country = forecast_data["city"]["country"]
-            
-            forecast_report = f"📅 5-Day Weather Forecast for {city}, {country}\n\n"
-            
-            # Group forecasts by day
-            daily_forecasts = {}
-            for item in forecast_data["list"]:
-                date = item["dt_txt"].split()[0]  # Extract date part
-                if date not in daily_forecasts:
-                    daily_forecasts[date] = []
-                daily_forecasts[date].append(item)
-            
-            # Display daily summary (limit to requested days)
-            for i, (date, forecasts) in enumerate(list(daily_forecasts.items())[:days]):
-                # Find forecast closest to midday (12:00)
-                midday_forecast = min(forecasts, key=lambda x: abs(12 - int(x["dt_txt"].split()[1].split(":")[0])))
-                
-                temp = midday_forecast["main"]["temp"]
-                temp_min = min(f["main"]["temp_min"] for f in forecasts)
-                temp_max = max(f["main"]["temp_max"] for f in forecasts)
-                description = midday_forecast["weather"][0]["description"].title()
-                humidity = midday_forecast["main"]["humidity"]
-                
-                # Format date nicely
-                from datetime import datetime
-                date_obj = datetime.strptime(date, "%Y-%m-%d")
-                day_name = date_obj.strftime("%A, %B %d")
-                
-                forecast_report += f"🗓️ **{day_name}**\n"
-                forecast_report += f"   🌡️ {temp_min:.1f}°C - {temp_max:.1f}°C\n"
-                forecast_report += f"   ☁️ {description}\n"
-                forecast_report += f"   💧 Humidity: {humidity}%\n\n"
-            
-            return forecast_report
-            
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                return f"❌ Error: Location '{location}' not found"
-            else:
-                return f"❌ Error: HTTP {e.code} - {e.reason}"
-        except Exception as e:
-            return f"❌ Error: {str(e)}"
+            line = await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # EOF; the last line may lack its newline
+            if e.partial:
+                yield e.partial
+            return
+        except asyncio.LimitOverrunError as e:
+            yield None
+            try:
+                await _discard_line(reader, e.consumed)
+            except asyncio.IncompleteReadError:
+                return
+            continue
+        yield line
+
+def write_message(message: bytes):
+    """Write one JSON-RPC message to stdout as a single flushed line"""
+    out = sys.stdout.buffer
+    out.write(message)
+    out.write(b"\n")
+    out.flush()
+
+async def handle_and_write(server: MCPWeatherServer, line: bytes, out_lock: asyncio.Lock):
+    """Process one message and write its response as a single line"""
+    response = await server.handle_message(line)
+    
+    # Send response if needed
+    if response:
+        async with out_lock:
+            write_message(response)
 
 async def main():
     """Main server loop"""
     server = MCPWeatherServer()
+    out_lock = asyncio.Lock()
+    in_flight = asyncio.Semaphore(64)
+    tasks = set()
     
     try:
-        while True:
-            # Read line from stdin
-            line = sys.stdin.readline()
-            if not line:  # EOF
-                break
-                
-            # Process message
-            response = await server.handle_message(line)
+        async for line in read_lines():
+            if line is None:
+                async with out_lock:
+                    write_message(_dumps({
+                        "jsonrpc": "2.0",
+                        "id": None,
+                        "error": {"code": -32700, "message": f"Parse error: message longer than {MAX_LINE} bytes"}
+                    }))
+                continue
             
-            # Send response if needed
-            if response:
-                print(response, flush=True)
+            # Dispatch each message concurrently, bounding how many are in flight
+            await in_flight.acquire()
+            task = asyncio.create_task(handle_and_write(server, line, out_lock))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            task.add_done_callback(lambda _: in_flight.release())
+        
+        # EOF - let pending requests finish
+        await asyncio.gather(*tasks)
                 
     except KeyboardInterrupt:
         pass
     except Exception as e:
-        print(json.dumps({
+        write_message(_dumps({
             "jsonrpc": "2.0",
             "id": None,
             "error": {"code": -32603, "message": f"Server error: {str(e)}"}
-        }), flush=True)
+        }))
+    finally:
+        await server.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -6,15 +6,16 @@ Simple MCP Weather Server - Minimal version for testing
 import asyncio
 import json
 import sys
-import os
 from typing import Any, Dict, List
-from urllib.request import urlopen
-from urllib.parse import urlencode
+
+from weather_api import WeatherClient
+from weather_utils import dumps as _dumps, loads as _loads
 
 # Simple MCP server implementation
 class SimpleMCPServer:
-    def __init__(self, name: str):
+    def __init__(self, name: str, weather: WeatherClient):
         self.name = name
+        self.weather = weather
         self.tools = []
     
     def add_tool(self, name: str, description: str, schema: Dict[str, Any]):
@@ -68,7 +69,7 @@ class SimpleMCPServer:
             
             try:
                 if tool_name == "get_weather":
-                    result = await get_weather(arguments.get("location", ""))
+                    result = await self.weather.current(arguments.get("location", ""))
                     return {
                         "jsonrpc": "2.0",
                         "id": request_id,
@@ -110,46 +111,16 @@ class SimpleMCPServer:
                 }
             }
 
-async def get_weather(location: str) -> str:
-    """Get weather using OpenWeatherMap API"""
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    
-    if not api_key:
-        return "Error: OPENWEATHER_API_KEY not set"
-    
-    if not location:
-        return "Error: Location not provided"
-    
-    try:
-        # Build URL
-        params = {
-            "q": location,
-            "appid": api_key,
-            "units": "metric"
-        }
-        url = f"https://api.openweathermap.org/data/2.5/weather?{urlencode(params)}"
-        
-        # Make request
-        with urlopen(url) as response:
-            data = json.loads(response.read().decode())
-        
-        # Format response
-        temp = data["main"]["temp"]
-        feels_like = data["main"]["feels_like"]
-        humidity = data["main"]["humidity"]
-        description = data["weather"][0]["description"]
-        
-        return f"""Weather in {data['name']}, {data['sys']['country']}:
-🌡️ Temperature: {temp}°C (feels like {feels_like}°C)
-☁️ Conditions: {description.title()}
-💧 Humidity: {humidity}%"""
-        
-    except Exception as e:
-        return f"Error getting weather for {location}: {str(e)}"
+def write_message(message: bytes):
+    """Write one JSON-RPC message to stdout as a single flushed line"""
+    out = sys.stdout.buffer
+    out.write(message)
+    out.write(b"\n")
+    out.flush()
 
 async def main():
     # Create server
-    server = SimpleMCPServer("simple-weather-server")
+    server = SimpleMCPServer("simple-weather-server", WeatherClient())
     
     # Add weather tool
     server.add_tool(
@@ -179,12 +150,12 @@ async def main():
                 if not line:
                     continue
                 
-                request = json.loads(line)
+                request = _loads(line)
                 response = await server.handle_request(request)
                 
                 # Only send response if it's not None (for notifications)
                 if response is not None:
-                    print(json.dumps(response), flush=True)
+                    write_message(_dumps(response))
                 
             except json.JSONDecodeError as e:
                 error_response = {
@@ -195,7 +166,7 @@ async def main():
                         "message": f"Parse error: {str(e)}"
                     }
                 }
-                print(json.dumps(error_response), flush=True)
+                write_message(_dumps(error_response))
             except Exception as e:
                 error_response = {
                     "jsonrpc": "2.0",
@@ -205,9 +176,11 @@ async def main():
                         "message": f"Internal error: {str(e)}"
                     }
                 }
-                print(json.dumps(error_response), flush=True)
+                write_message(_dumps(error_response))
     except KeyboardInterrupt:
         pass
+    finally:
+        await server.weather.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
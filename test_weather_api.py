@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the WeatherClient caches (no API key or network needed)
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from weather_api import WeatherClient
+
+os.environ.setdefault("OPENWEATHER_API_KEY", "test-key")
+
+WEATHER = {
+    "name": "London",
+    "sys": {"country": "GB"},
+    "main": {"temp": 12.3, "feels_like": 11.0, "humidity": 80, "pressure": 1012},
+    "weather": [{"description": "light rain"}],
+    "wind": {"speed": 4.1}
+}
+
+def stub_network(client: WeatherClient, coords=(51.5074, -0.1278)):
+    """Replace the client's HTTP calls with counting stubs"""
+    calls = {"geo": 0, "weather": 0, "stale": []}
+    release = asyncio.Event()
+    release.set()
+    
+    async def fetch(url, params):
+        calls["geo"] += 1
+        await asyncio.sleep(0.01)
+        return [{"lat": coords[0], "lon": coords[1]}]
+    
+    async def fetch_entry(url, params, stale=None):
+        calls["weather"] += 1
+        calls["stale"].append(stale)
+        await asyncio.sleep(0.01)
+        await release.wait()
+        return (WEATHER, time.monotonic(), 'W/"1"', None)
+    
+    client._fetch = fetch
+    client._fetch_entry = fetch_entry
+    return calls, release
+
+def test_concurrent_lookups_share_requests():
+    """Concurrent identical lookups make one geocode call and one weather fetch"""
+    async def run():
+        client = WeatherClient(cache_path=None)
+        calls, _ = stub_network(client)
+        reports = await asyncio.gather(*[client.current("London") for _ in range(5)])
+        await client.aclose()
+        return calls, reports
+    
+    calls, reports = asyncio.run(run())
+    assert calls["geo"] == 1 and calls["weather"] == 1, calls
+    assert len(set(reports)) == 1 and "London, GB" in reports[0]
+
+def test_stale_entry_served_while_refreshing():
+    """Past the soft TTL the cached report returns at once and one refresh runs"""
+    async def run():
+        client = WeatherClient(cache_path=None)
+        calls, release = stub_network(client)
+        first = await client.current("London")
+        
+        key = next(iter(client._wx_cache))
+        data, fetched_at, etag, last_modified = client._wx_cache[key]
+        stale = (data, fetched_at - client._soft_ttl["weather"] - 1, etag, last_modified)
+        client._wx_cache[key] = stale
+        
+        release.clear()
+        again = await asyncio.wait_for(client.current("London"), timeout=1)
+        await client.current("London")
+        refresh = client._inflight[key]
+        release.set()
+        await refresh
+        
+        fresh = time.monotonic() - client._wx_cache[key][1] < client._soft_ttl["weather"]
+        await client.aclose()
+        return calls, first, again, stale, fresh
+    
+    calls, first, again, stale, fresh = asyncio.run(run())
+    assert again == first
+    assert calls["weather"] == 2 and calls["stale"][1] == stale, calls
+    assert fresh
+
+def test_not_modified_reuses_cached_body():
+    """A 304 revalidation keeps the stale body and sends its validators"""
+    class Response:
+        status = 304
+        headers = {}
+        
+        async def __aenter__(self):
+            return self
+        
+        async def __aexit__(self, *exc):
+            return False
+    
+    class Session:
+        closed = False
+        sent = None
+        
+        def get(self, url, params=None, headers=None):
+            Session.sent = headers
+            return Response()
+    
+    async def run():
+        client = WeatherClient(cache_path=None)
+        client._get_session = Session
+        stale = (WEATHER, time.monotonic() - 1000, 'W/"1"', "Mon, 01 Jan 2024 00:00:00 GMT")
+        entry = await client._fetch_entry("https://example.invalid/weather", {}, stale)
+        await client.aclose()
+        return stale, entry
+    
+    stale, entry = asyncio.run(run())
+    assert entry[0] is stale[0] and entry[2:] == stale[2:]
+    assert time.monotonic() - entry[1] < 5
+    assert Session.sent == {"If-None-Match": 'W/"1"', "If-Modified-Since": stale[3]}
+
+def test_neighbouring_cell_reused():
+    """Points near a cell edge reuse an adjacent cached cell, others get their own"""
+    client = WeatherClient(cache_path=None)
+    client._wx_cache[("weather", 515, -1, "metric")] = (WEATHER, time.monotonic(), None, None)
+    
+    assert client._bucket_key(client._wx_cache, "weather", 51.56, -0.12) == ("weather", 515, -1, "metric")
+    assert client._bucket_key(client._wx_cache, "weather", 51.58, -0.12) == ("weather", 516, -1, "metric")
+    asyncio.run(client.aclose())
+
+def test_disk_cache_survives_restart():
+    """A new client on the same cache file answers without any requests"""
+    async def run(path):
+        client = WeatherClient(cache_path=path)
+        stub_network(client)
+        first = await client.current("London")
+        await client.aclose()
+        
+        restarted = WeatherClient(cache_path=path)
+        calls, _ = stub_network(restarted)
+        second = await restarted.current("London")
+        await restarted.aclose()
+        return calls, first, second
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        calls, first, second = asyncio.run(run(os.path.join(tmp, "cache.sqlite")))
+    assert second == first
+    assert calls["geo"] == 0 and calls["weather"] == 0, calls
+
+if __name__ == "__main__":
+    print("🧪 Testing WeatherClient caches")
+    print("=" * 40)
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {test.__doc__}")
+    print("\n🎉 Test completed!")
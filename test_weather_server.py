@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Offline tests for weather_server's retries, cache and request sharing (no API key or network needed)
+"""
+
+import asyncio
+import time
+
+import httpx
+from aiolimiter import AsyncLimiter
+
+import weather_server
+
+WEATHER = {
+    "name": "London",
+    "sys": {"country": "GB"},
+    "main": {"temp": 12.3, "feels_like": 11.0, "humidity": 80, "pressure": 1012},
+    "weather": [{"description": "light rain"}],
+    "wind": {"speed": 4.1}
+}
+
+def run_with(responses, call):
+    """Run call() against a mock OpenWeatherMap that answers with responses in turn.
+    
+    Returns (result, upstream request count, elapsed seconds).
+    """
+    requests = []
+    
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        # Yield like a real request would, so concurrent callers overlap
+        await asyncio.sleep(0.01)
+        return responses[min(len(requests), len(responses)) - 1]
+    
+    async def run():
+        weather_server.API_KEY = "test-key"
+        weather_server._cache.clear()
+        # Limiters bind to one event loop; each test runs in its own
+        weather_server._rate_limit = AsyncLimiter(1000, 1)
+        weather_server._concurrency = asyncio.Semaphore(16)
+        weather_server._client = httpx.AsyncClient(
+            base_url=weather_server.BASE_URL,
+            transport=httpx.MockTransport(handler)
+        )
+        started = time.monotonic()
+        try:
+            result = await call()
+        finally:
+            await weather_server._client.aclose()
+        return result, len(requests), time.monotonic() - started
+    
+    return asyncio.run(run())
+
+def test_transient_error_retried():
+    """A 503 is retried and the following 200 is reported"""
+    report, calls, _ = run_with(
+        [httpx.Response(503), httpx.Response(200, json=WEATHER)],
+        lambda: weather_server.get_current_weather("London")
+    )
+    assert calls == 2
+    assert report.startswith("Current Weather for London, GB")
+
+def test_retries_stop_after_max_attempts():
+    """A persistent 500 is reported after the last attempt"""
+    report, calls, _ = run_with(
+        [httpx.Response(500)],
+        lambda: weather_server.get_current_weather("London")
+    )
+    assert calls == weather_server._MAX_ATTEMPTS
+    assert report.endswith("Status: 500")
+
+def test_client_error_not_retried():
+    """A 404 is reported straight away"""
+    report, calls, _ = run_with(
+        [httpx.Response(404)],
+        lambda: weather_server.get_current_weather("Nowhere")
+    )
+    assert calls == 1
+    assert report == "Error: Could not get weather for Nowhere. Status: 404"
+
+def test_short_retry_after_honored():
+    """A 429 waits for its Retry-After before retrying"""
+    report, calls, elapsed = run_with(
+        [httpx.Response(429, headers={"Retry-After": "0.2"}), httpx.Response(200, json=WEATHER)],
+        lambda: weather_server.get_current_weather("London")
+    )
+    assert calls == 2 and elapsed >= 0.2
+    assert report.startswith("Current Weather for London, GB")
+
+def test_long_retry_after_not_waited():
+    """A 429 asking for a long wait is reported at once"""
+    report, calls, elapsed = run_with(
+        [httpx.Response(429, headers={"Retry-After": "3600"})],
+        lambda: asyncio.wait_for(weather_server.get_current_weather("London"), timeout=2)
+    )
+    assert calls == 1 and elapsed < 1
+    assert report.endswith("Status: 429")
+
+def test_concurrent_calls_share_request():
+    """Concurrent calls for one city, in any spelling or format, make one request"""
+    reports, calls, _ = run_with(
+        [httpx.Response(200, json=WEATHER)],
+        lambda: asyncio.gather(
+            *[weather_server.get_current_weather(city) for city in ("London", " london", "LONDON")],
+            weather_server.get_current_weather("London", format="json")
+        )
+    )
+    assert calls == 1
+    assert reports[0] == reports[1] == reports[2]
+    assert reports[3].startswith('{"location":"London"')
+
+def test_cache_evicts_oldest_entry():
+    """A full cache drops its oldest entry, and expired entries read as misses"""
+    size = weather_server._CACHE_SIZE
+    weather_server._cache.clear()
+    weather_server._CACHE_SIZE = 2
+    try:
+        for city in ("a", "b", "c"):
+            weather_server._cache_put(("weather", city, "metric"), {"name": city})
+        assert weather_server._cache_get(("weather", "a", "metric"), ttl=60) is None
+        assert weather_server._cache_get(("weather", "c", "metric"), ttl=60) == {"name": "c"}
+        assert weather_server._cache_get(("weather", "b", "metric"), ttl=0) is None
+        assert ("weather", "b", "metric") not in weather_server._cache
+    finally:
+        weather_server._CACHE_SIZE = size
+        weather_server._cache.clear()
+
+if __name__ == "__main__":
+    print("🧪 Testing weather_server")
+    print("=" * 40)
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {test.__doc__}")
+    print("\n🎉 Test completed!")
@@ -0,0 +1,469 @@
+"""
+Shared OpenWeatherMap client used by the MCP weather servers
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+from cachetools import LRUCache, TLRUCache
+
+from weather_utils import dumps, loads, single_flight
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; plain numpy reductions are used without it
+    njit = None
+
+# Where fetched data is kept between server restarts
+DEFAULT_CACHE_PATH = "~/.cache/mcp-weather/cache.sqlite"
+
+# Report templates
+WEATHER_REPORT = (
+    "🌤️ Weather Report for {city}, {country}\n\n"
+    "🌡️ Temperature: {temp}°C (feels like {feels_like}°C)\n"
+    "☁️ Conditions: {description}\n"
+    "💧 Humidity: {humidity}%\n"
+    "🌪️ Wind Speed: {wind_speed} m/s\n"
+    "📊 Pressure: {pressure} hPa"
+)
+FORECAST_HEADER = "📅 5-Day Weather Forecast for {city}, {country}\n\n"
+FORECAST_DAY = (
+    "🗓️ **{day_name}**\n"
+    "   🌡️ {temp_min:.1f}°C - {temp_max:.1f}°C\n"
+    "   ☁️ {description}\n"
+    "   💧 Humidity: {humidity}%\n\n"
+)
+
+# Max distance in degrees from a point to a neighbouring cache cell's centre
+# for that cell's entry to be reused (cells are 0.1 degrees wide)
+NEIGHBOR_TOLERANCE = 0.075
+
+@lru_cache(maxsize=64)
+def format_day(year: int, month: int, day: int) -> str:
+    """Format a forecast date as e.g. 'Monday, January 01'"""
+    return datetime(year, month, day).strftime("%A, %B %d")
+
+def daily_summary(items: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any], float, float]]:
+    """Group 3-hourly forecast items by day as (date, midday item, min temp, max temp)"""
+    if len(items) < 16:
+        # numpy's setup cost outweighs the win on short lists
+        daily_forecasts = {}
+        for item in items:
+            daily_forecasts.setdefault(item["dt_txt"][:10], []).append(item)
+        return [
+            (
+                date,
+                min(forecasts, key=lambda x: abs(12 - int(x["dt_txt"][11:13]))),
+                min(f["main"]["temp_min"] for f in forecasts),
+                max(f["main"]["temp_max"] for f in forecasts)
+            )
+            for date, forecasts in daily_forecasts.items()
+        ]
+    
+    # Items are sorted by timestamp, so each UTC day is a contiguous run
+    count = len(items)
+    dts = np.fromiter((it["dt"] for it in items), dtype=np.int64, count=count)
+    tmins = np.fromiter((it["main"]["temp_min"] for it in items), dtype=np.float64, count=count)
+    tmaxs = np.fromiter((it["main"]["temp_max"] for it in items), dtype=np.float64, count=count)
+    
+    # Hours are UTC, matching dt_txt
+    midday, day_min, day_max = aggregate_forecast((dts % 86400) // 3600, dts // 86400, tmins, tmaxs)
+    return [
+        (items[i]["dt_txt"][:10], items[i], float(low), float(high))
+        for i, low, high in zip(midday, day_min, day_max)
+    ]
+
+def _aggregate_numpy(hours_of_day, day_idx, tmins, tmaxs):
+    """Reduce per-item arrays to (midday index, min temp, max temp) per day"""
+    _, starts = np.unique(day_idx, return_index=True)
+    ends = np.append(starts[1:], len(day_idx))
+    distance = np.abs(hours_of_day - 12)
+    midday = np.array([start + np.argmin(distance[start:end]) for start, end in zip(starts, ends)])
+    return midday, np.minimum.reduceat(tmins, starts), np.maximum.reduceat(tmaxs, starts)
+
+if njit is not None:
+    @njit(cache=True)
+    def aggregate_forecast(hours_of_day, day_idx, tmins, tmaxs):
+        """Reduce per-item arrays to (midday index, min temp, max temp) per day"""
+        count = day_idx.shape[0]
+        days = 1
+        for i in range(1, count):
+            if day_idx[i] != day_idx[i - 1]:
+                days += 1
+        
+        midday = np.empty(days, dtype=np.int64)
+        day_min = np.empty(days, dtype=tmins.dtype)
+        day_max = np.empty(days, dtype=tmaxs.dtype)
+        
+        day = -1
+        best = 0
+        for i in range(count):
+            distance = abs(hours_of_day[i] - 12)
+            if i == 0 or day_idx[i] != day_idx[i - 1]:
+                day += 1
+                midday[day] = i
+                day_min[day] = tmins[i]
+                day_max[day] = tmaxs[i]
+                best = distance
+                continue
+            if distance < best:
+                best = distance
+                midday[day] = i
+            if tmins[i] < day_min[day]:
+                day_min[day] = tmins[i]
+            if tmaxs[i] > day_max[day]:
+                day_max[day] = tmaxs[i]
+        return midday, day_min, day_max
+else:
+    aggregate_forecast = _aggregate_numpy
+
+class WeatherClient:
+    """Fetches, caches and formats OpenWeatherMap data"""
+    
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH):
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Geocoded (lat, lon) per normalized location name; places don't move
+        self._geo_cache = LRUCache(maxsize=1024)
+        # Raw OpenWeatherMap responses keyed by (endpoint, lat cell, lon cell, units)
+        # on a 0.1 degree grid, stored as (data, fetched_at, etag, last_modified).
+        # Entries past the soft TTL are served stale while a background refresh
+        # revalidates them; entries expire at the hard TTL after fetched_at.
+        self._soft_ttl = {"weather": 300, "forecast": 900}
+        self._hard_ttl = {"weather": 900, "forecast": 1800}
+        self._wx_cache = TLRUCache(maxsize=512, ttu=self._expires_at)
+        self._fc_cache = TLRUCache(maxsize=512, ttu=self._expires_at)
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        # Cache misses being fetched, so concurrent lookups share one request
+        self._pending: Dict[Tuple, asyncio.Task] = {}
+        # Caps concurrent requests to OpenWeatherMap
+        self._http_limit = asyncio.Semaphore(32)
+        # On-disk copy of the caches so a restarted server starts warm
+        self._db = self._open_db(cache_path) if cache_path else None
+        
+        if njit is not None:
+            # Compile (or load from numba's cache) now rather than on the first forecast
+            aggregate_forecast(
+                np.zeros(1, dtype=np.int64),
+                np.zeros(1, dtype=np.int64),
+                np.zeros(1, dtype=np.float64),
+                np.zeros(1, dtype=np.float64)
+            )
+    
+    def _expires_at(self, key: Tuple, entry: Tuple, now: float) -> float:
+        """Hard expiry time of a cache entry"""
+        return entry[1] + self._hard_ttl[key[0]]
+    
+    def _open_db(self, cache_path: str) -> Optional[sqlite3.Connection]:
+        """Open the persistent cache, dropping entries too old to be served"""
+        try:
+            path = os.path.expanduser(cache_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Short busy timeout: these calls run on the event loop, and a locked
+            # database just means falling back to the in-memory caches
+            db = sqlite3.connect(path, isolation_level=None, timeout=0.1)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS wx"
+                "(key TEXT PRIMARY KEY, json BLOB, fetched_at REAL, etag TEXT, last_modified TEXT)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS geo(name TEXT PRIMARY KEY, lat REAL, lon REAL)")
+            db.execute("DELETE FROM wx WHERE fetched_at < ?", (time.time() - max(self._hard_ttl.values()),))
+            return db
+        except (OSError, sqlite3.Error):
+            # Persistence is best-effort; run with the in-memory caches only
+            return None
+    
+    def _load(self, key: Tuple) -> Optional[Tuple]:
+        """Read a cache entry from disk if it is still within its hard TTL"""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT json, fetched_at, etag, last_modified FROM wx WHERE key = ?",
+                (":".join(map(str, key)),)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        
+        # Stored times are wall-clock; in memory they are monotonic
+        age = time.time() - row[1]
+        if age >= self._hard_ttl[key[0]]:
+            return None
+        return (loads(row[0]), time.monotonic() - age, row[2], row[3])
+    
+    def _store(self, key: Tuple, entry: Tuple):
+        """Write a freshly fetched cache entry to disk"""
+        if self._db is None:
+            return
+        data, fetched_at, etag, last_modified = entry
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO wx VALUES (?, ?, ?, ?, ?)",
+                (
+                    ":".join(map(str, key)),
+                    dumps(data),
+                    time.time() - (time.monotonic() - fetched_at),
+                    etag,
+                    last_modified
+                )
+            )
+        except sqlite3.Error:
+            # Locked or full; the entry is still cached in memory
+            pass
+    
+    def _load_geo(self, name: str) -> Optional[Tuple[float, float]]:
+        """Read geocoded coordinates from disk"""
+        if self._db is None:
+            return None
+        try:
+            return self._db.execute("SELECT lat, lon FROM geo WHERE name = ?", (name,)).fetchone()
+        except sqlite3.Error:
+            return None
+    
+    def _store_geo(self, name: str, coords: Tuple[float, float]):
+        """Write geocoded coordinates to disk"""
+        if self._db is None:
+            return
+        try:
+            self._db.execute("INSERT OR REPLACE INTO geo VALUES (?, ?, ?)", (name, *coords))
+        except sqlite3.Error:
+            pass
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared HTTP session, creating it on first use"""
+        if self._session is None or self._session.closed:
+            # Keep-alive connections let repeat calls skip the TCP + TLS handshake
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._session
+    
+    async def aclose(self):
+        """Cancel outstanding fetches and close the shared HTTP session"""
+        for task in [*self._inflight.values(), *self._pending.values()]:
+            task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+    
+    async def _fetch(self, url: str, params: Dict[str, Any]) -> Any:
+        """GET an OpenWeatherMap endpoint and decode the JSON body"""
+        async with self._http_limit, self._get_session().get(url, params=params) as response:
+            response.raise_for_status()
+            return loads(await response.read())
+    
+    async def _geocode(self, location: str, api_key: str) -> Optional[Tuple[float, float]]:
+        """Resolve a location name to (lat, lon) via OpenWeatherMap geocoding"""
+        name = location.strip().lower()
+        coords = self._geo_cache.get(name)
+        if coords is None:
+            row = self._load_geo(name)
+            if row is not None:
+                coords = self._geo_cache[name] = row
+        if coords is None:
+            coords = await single_flight(self._pending, ("geo", name), lambda: self._lookup(name, location, api_key))
+        return coords
+    
+    async def _lookup(self, name: str, location: str, api_key: str) -> Optional[Tuple[float, float]]:
+        """Query the geocoding API and remember the result"""
+        results = await self._fetch(
+            "https://api.openweathermap.org/geo/1.0/direct",
+            {"q": location, "limit": 1, "appid": api_key}
+        )
+        if not results:
+            return None
+        coords = (results[0]["lat"], results[0]["lon"])
+        self._geo_cache[name] = coords
+        self._store_geo(name, coords)
+        return coords
+    
+    def _bucket_key(self, cache: TLRUCache, endpoint: str, lat: float, lon: float) -> Tuple:
+        """Cache key for the ~11 km grid cell holding (lat, lon)"""
+        lat_cell, lon_cell = round(lat * 10), round(lon * 10)
+        key = (endpoint, lat_cell, lon_cell, "metric")
+        if key in cache:
+            return key
+        
+        # Close to a cell edge, an adjacent cell's entry is near enough to reuse
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                near_lat, near_lon = lat_cell + d_lat, lon_cell + d_lon
+                if (abs(lat - near_lat / 10) <= NEIGHBOR_TOLERANCE
+                        and abs(lon - near_lon / 10) <= NEIGHBOR_TOLERANCE):
+                    near_key = (endpoint, near_lat, near_lon, "metric")
+                    if near_key in cache:
+                        return near_key
+        return key
+    
+    async def _fetch_entry(self, url: str, params: Dict[str, Any], stale: Optional[Tuple] = None) -> Tuple:
+        """Fetch a (data, fetched_at, etag, last_modified) cache entry.
+        
+        A stale entry is revalidated with a conditional GET; on 304 its body is reused.
+        """
+        headers = {}
+        if stale is not None:
+            _, _, etag, last_modified = stale
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        
+        async with self._http_limit, self._get_session().get(url, params=params, headers=headers) as response:
+            if response.status == 304 and stale is not None:
+                return (stale[0], time.monotonic(), stale[2], stale[3])
+            response.raise_for_status()
+            data = loads(await response.read())
+            return (data, time.monotonic(), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    
+    async def _cached_fetch(self, cache: TLRUCache, key: Tuple,
+                            url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch through the cache, refreshing stale entries in the background"""
+        entry = cache.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                cache[key] = entry
+        if entry is None:
+            return await single_flight(self._pending, key, lambda: self._fill(cache, key, url, params))
+        
+        data, fetched_at = entry[:2]
+        if time.monotonic() - fetched_at >= self._soft_ttl[key[0]] and key not in self._inflight:
+            self._inflight[key] = asyncio.create_task(self._refresh(cache, key, url, params, entry))
+        return data
+    
+    async def _fill(self, cache: TLRUCache, key: Tuple, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch a missing cache entry"""
+        entry = await self._fetch_entry(url, params)
+        cache[key] = entry
+        self._store(key, entry)
+        return entry[0]
+    
+    async def _refresh(self, cache: TLRUCache, key: Tuple,
+                       url: str, params: Dict[str, Any], stale: Tuple):
+        """Re-fetch a stale cache entry"""
+        try:
+            entry = await self._fetch_entry(url, params, stale)
+            cache[key] = entry
+            self._store(key, entry)
+        except Exception:
+            # Keep serving the stale entry until it hits the hard TTL
+            pass
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def current(self, location: str) -> str:
+        """Get a current weather report from OpenWeatherMap"""
+        api_key = os.getenv("OPENWEATHER_API_KEY")
+        
+        if not api_key:
+            return "❌ Error: OPENWEATHER_API_KEY environment variable not set"
+        
+        if not location:
+            return "❌ Error: No location provided"
+        
+        try:
+            coords = await self._geocode(location, api_key)
+            if coords is None:
+                return f"❌ Error: Location '{location}' not found"
+            lat, lon = coords
+            
+            # Build API URL
+            base_url = "https://api.openweathermap.org/data/2.5/weather"
+            params = {
+                "lat": lat,
+                "lon": lon,
+                "appid": api_key,
+                "units": "metric"
+            }
+            
+            # Make API request (or serve it from the cache)
+            cache_key = self._bucket_key(self._wx_cache, "weather", lat, lon)
+            weather_data = await self._cached_fetch(self._wx_cache, cache_key, base_url, params)
+            
+            # Format weather information
+            main = weather_data["main"]
+            return WEATHER_REPORT.format(
+                city=weather_data["name"],
+                country=weather_data["sys"]["country"],
+                temp=main["temp"],
+                feels_like=main["feels_like"],
+                description=weather_data["weather"][0]["description"].title(),
+                humidity=main["humidity"],
+                wind_speed=weather_data["wind"]["speed"],
+                pressure=main["pressure"]
+            )
+            
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return f"❌ Error: Location '{location}' not found"
+            else:
+                return f"❌ Error: HTTP {e.status} - {e.message}"
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
+    
+    async def forecast(self, location: str, days: int = 5) -> str:
+        """Get a daily forecast report from OpenWeatherMap"""
+        api_key = os.getenv("OPENWEATHER_API_KEY")
+        
+        if not api_key:
+            return "❌ Error: OPENWEATHER_API_KEY environment variable not set"
+        
+        if not location:
+            return "❌ Error: No location provided"
+        
+        try:
+            coords = await self._geocode(location, api_key)
+            if coords is None:
+                return f"❌ Error: Location '{location}' not found"
+            lat, lon = coords
+            
+            # Build API URL for forecast
+            base_url = "https://api.openweathermap.org/data/2.5/forecast"
+            params = {
+                "lat": lat,
+                "lon": lon,
+                "appid": api_key,
+                "units": "metric"
+            }
+            
+            # Make API request (or serve it from the cache)
+            cache_key = self._bucket_key(self._fc_cache, "forecast", lat, lon)
+            forecast_data = await self._cached_fetch(self._fc_cache, cache_key, base_url, params)
+            
+            # Format forecast information
+            parts = [FORECAST_HEADER.format(
+                city=forecast_data["city"]["name"],
+                country=forecast_data["city"]["country"]
+            )]
+            
+            # Display daily summary (limit to requested days)
+            for date, midday_forecast, temp_min, temp_max in daily_summary(forecast_data["list"])[:days]:
+                parts.append(FORECAST_DAY.format(
+                    day_name=format_day(int(date[:4]), int(date[5:7]), int(date[8:10])),
+                    temp_min=temp_min,
+                    temp_max=temp_max,
+                    description=midday_forecast["weather"][0]["description"].title(),
+                    humidity=midday_forecast["main"]["humidity"]
+                ))
+            
+            return "".join(parts)
+            
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return f"❌ Error: Location '{location}' not found"
+            else:
+                return f"❌ Error: HTTP {e.status} - {e.message}"
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
@@ -5,8 +5,11 @@ MCP Weather Server - A simple Model Context Protocol server for weather data
 import asyncio
 import json
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import httpx
+from aiolimiter import AsyncLimiter
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
@@ -21,8 +24,24 @@ from mcp.types import (
     LoggingLevel
 )
 import os
+import random
 from dotenv import load_dotenv
 
+# Response bodies are parsed straight from response.content (bytes), never via
+# response.json()/response.text, so the body isn't decoded to str first
+from weather_utils import dumps as _dumps, loads as _loads, single_flight
+
+try:
+    import h2  # noqa: F401  (enables httpx's HTTP/2 support)
+    _HTTP2 = True
+except ImportError:  # Stay on HTTP/1.1 keep-alive
+    _HTTP2 = False
+
+try:
+    import uvloop
+except ImportError:  # Run on the default asyncio event loop
+    uvloop = None
+
 load_dotenv()
 
 app = Server("weather-server")
@@ -30,82 +49,199 @@ app = Server("weather-server")
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 BASE_URL = "https://api.openweathermap.org/data/2.5"
 
+# Outbound request limits: at most 16 at once, and the free tier's 60 per minute.
+# Only network fetches acquire them, so cache hits never spend the budget.
+_concurrency = asyncio.Semaphore(16)
+_rate_limit = AsyncLimiter(60, 60)
+
+# Transient upstream failures are retried in-process before reporting an error
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_ATTEMPTS = 3
+# Longest Retry-After worth waiting for; a longer one is reported to the caller
+_MAX_RETRY_AFTER = 5.0
+
+def _retry_delay(response: httpx.Response, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying, or None if the server asks for too long"""
+    delay = min(2 ** attempt * 0.5, 4.0) + random.random() * 0.1
+    if response.status_code == 429:
+        try:
+            delay = float(response.headers.get("Retry-After", delay))
+        except ValueError:  # HTTP-date form; keep the backoff delay
+            pass
+    return delay if delay <= _MAX_RETRY_AFTER else None
+
+# (temperature symbol, wind speed unit) per units value; OpenWeatherMap
+# answers in Kelvin and m/s for anything other than metric or imperial
+_UNIT_TABLE = {
+    "metric": ("°C", "m/s"),
+    "imperial": ("°F", "mph"),
+    "kelvin": ("K", "m/s")
+}
+
+# Shared across tool calls so keep-alive connections skip the TCP + TLS handshake
+_client: Optional[httpx.AsyncClient] = None
+
+# Parsed OpenWeatherMap responses keyed by (endpoint, location, units), stored as
+# (stored_at, data) and rendered per call, so every output format shares one
+# entry; the oldest entry is evicted once the cache is full
+_cache: Dict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]] = {}
+_CACHE_SIZE = 256
+
+def _cache_get(key: Tuple[str, str, str], ttl: float) -> Optional[Dict[str, Any]]:
+    """Return a cached result younger than ttl seconds"""
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    stored_at, value = entry
+    if time.monotonic() - stored_at < ttl:
+        return value
+    del _cache[key]
+    return None
+
+def _cache_put(key: Tuple[str, str, str], value: Dict[str, Any]):
+    """Store a result, evicting the oldest entry when full"""
+    if key not in _cache and len(_cache) >= _CACHE_SIZE:
+        del _cache[next(iter(_cache))]
+    _cache[key] = (time.monotonic(), value)
+
+# Fetches in progress, so concurrent identical calls share one request
+_inflight: Dict[Tuple[str, str, str], asyncio.Task] = {}
+
+def _get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            # _get() retries itself; no transport-level retries underneath it
+            transport=httpx.AsyncHTTPTransport(
+                http2=_HTTP2,
+                retries=0,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=64)
+            ),
+            timeout=10.0
+        )
+    return _client
+
+async def _get(path: str, params: Dict[str, Any]) -> httpx.Response:
+    """GET an OpenWeatherMap endpoint within the concurrency and rate limits"""
+    for attempt in range(_MAX_ATTEMPTS):
+        async with _rate_limit, _concurrency:
+            response = await _get_client().get(path, params=params)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_ATTEMPTS - 1:
+            return response
+        delay = _retry_delay(response, attempt)
+        if delay is None:
+            return response
+        # Back off outside the limits so waiting retries don't hold a slot
+        await asyncio.sleep(delay)
+    return response
+
+# Tool definitions are constant, so they are built (and validated) once at import
+_TOOLS: List[Tool] = [
+    Tool(
+        name="get_current_weather",
+        description="Get current weather for a specific location",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'London', 'New York', 'Jakarta')"
+                },
+                "units": {
+                    "type": "string",
+                    "enum": ["metric", "imperial", "kelvin"],
+                    "default": "metric",
+                    "description": "Temperature units (metric for Celsius, imperial for Fahrenheit)"
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["pretty", "json"],
+                    "default": "pretty",
+                    "description": "Output style: readable text, or compact JSON with just the values"
+                }
+            },
+            "required": ["location"]
+        }
+    ),
+    Tool(
+        name="get_weather_forecast",
+        description="Get 5-day weather forecast for a specific location",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'London', 'New York', 'Jakarta')"
+                },
+                "units": {
+                    "type": "string",
+                    "enum": ["metric", "imperial", "kelvin"],
+                    "default": "metric",
+                    "description": "Temperature units"
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["pretty", "json"],
+                    "default": "pretty",
+                    "description": "Output style: readable text, or compact JSON with just the values"
+                }
+            },
+            "required": ["location"]
+        }
+    ),
+    Tool(
+        name="get_weather_overview",
+        description="Get current weather and the 5-day forecast for a specific location in one call",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "location": {
+                    "type": "string",
+                    "description": "City name (e.g., 'London', 'New York', 'Jakarta')"
+                },
+                "units": {
+                    "type": "string",
+                    "enum": ["metric", "imperial", "kelvin"],
+                    "default": "metric",
+                    "description": "Temperature units"
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["pretty", "json"],
+                    "default": "pretty",
+                    "description": "Output style: readable text, or compact JSON with just the values"
+                }
+            },
+            "required": ["location"]
+        }
+    )
+]
+
 @app.list_tools()
 async def list_tools() -> List[Tool]:
     """List available weather tools"""
-    return [
-        Tool(
-            name="get_current_weather",
-            description="Get current weather for a specific location",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "City name (e.g., 'London', 'New York', 'Jakarta')"
-                    },
-                    "units": {
-                        "type": "string",
-                        "enum": ["metric", "imperial", "kelvin"],
-                        "default": "metric",
-                        "description": "Temperature units (metric for Celsius, imperial for Fahrenheit)"
-                    }
-                },
-                "required": ["location"]
-            }
-        ),
-        Tool(
-            name="get_weather_forecast",
-            description="Get 5-day weather forecast for a specific location",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "City name (e.g., 'London', 'New York', 'Jakarta')"
-                    },
-                    "units": {
-                        "type": "string",
-                        "enum": ["metric", "imperial", "kelvin"],
-                        "default": "metric",
-                        "description": "Temperature units"
-                    }
-                },
-                "required": ["location"]
-            }
-        )
-    ]
+    return _TOOLS
 
 @app.call_tool()
 async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
     """Handle tool calls"""
     
-    if not API_KEY:
-        return [TextContent(
-            type="text",
-            text="Error: OpenWeatherMap API key not configured. Please set OPENWEATHER_API_KEY environment variable."
-        )]
-    
     try:
-        if name == "get_current_weather":
-            result = await get_current_weather(
-                location=arguments["location"],
-                units=arguments.get("units", "metric")
-            )
-            return [TextContent(type="text", text=result)]
-            
-        elif name == "get_weather_forecast":
-            result = await get_weather_forecast(
-                location=arguments["location"],
-                units=arguments.get("units", "metric")
-            )
-            return [TextContent(type="text", text=result)]
-            
-        else:
+        handler = _HANDLERS.get(name)
+        if handler is None:
             return [TextContent(
                 type="text",
                 text=f"Error: Unknown tool '{name}'"
             )]
+        
+        result = await handler(
+            location=arguments["location"],
+            units=arguments.get("units", "metric"),
+            format=arguments.get("format", "pretty")
+        )
+        return [TextContent(type="text", text=result)]
             
     except Exception as e:
         return [TextContent(
@@ -113,96 +249,233 @@ async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             text=f"Error calling tool '{name}': {str(e)}"
         )]
 
-async def get_current_weather(location: str, units: str = "metric") -> str:
+async def get_current_weather(location: str, units: str = "metric", format: str = "pretty") -> str:
     """Get current weather for a location"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{BASE_URL}/weather",
-            params={
-                "q": location,
-                "appid": API_KEY,
-                "units": units
-            }
-        )
-        
-        if response.status_code != 200:
-            return f"Error: Could not get weather for {location}. Status: {response.status_code}"
-        
-        data = response.json()
-        
-        temp = data["main"]["temp"]
-        feels_like = data["main"]["feels_like"]
-        humidity = data["main"]["humidity"]
-        pressure = data["main"]["pressure"]
-        description = data["weather"][0]["description"]
-        wind_speed = data["wind"]["speed"]
-        
-        unit_symbol = "°C" if units == "metric" else "°F" if units == "imperial" else "K"
-        
-        weather_info = f"""Current Weather for {data['name']}, {data['sys']['country']}:
+    # Case and whitespace variants share one cache entry and one query; reports show
+    # the canonical name from the response, errors the caller's own spelling
+    query = location.strip().lower()
+    status, data = await _current_data(query, units)
+    if data is None:
+        return f"Error: Could not get weather for {location}. Status: {status}"
+    
+    if format == "json":
+        return _dumps(_current_summary(data, units)).decode()
+    return _format_current(data, units)
+
+async def _current_data(location: str, units: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """Return (status, parsed /weather response) for a normalized location"""
+    cache_key = ("weather", location, units)
+    data = _cache_get(cache_key, ttl=900)
+    if data is not None:
+        return 200, data
+    return await single_flight(_inflight, cache_key, lambda: _fetch_json(
+        "/weather",
+        {
+            "q": location,
+            "appid": API_KEY,
+            "units": units
+        },
+        cache_key
+    ))
+
+async def _fetch_json(path: str, params: Dict[str, Any],
+                      cache_key: Tuple[str, str, str]) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """Fetch an endpoint as (status, parsed body), caching successful responses"""
+    response = await _get(path, params=params)
+    
+    if response.status_code != 200:
+        return response.status_code, None
+    
+    data = _loads(response.content)
+    _cache_put(cache_key, data)
+    return response.status_code, data
+
+def _current_summary(data: Dict[str, Any], units: str) -> Dict[str, Any]:
+    """Just the values of a /weather response, for JSON output"""
+    main = data["main"]
+    return {
+        "location": data["name"],
+        "country": data["sys"]["country"],
+        "units": units,
+        "temp": main["temp"],
+        "feels_like": main["feels_like"],
+        "humidity": main["humidity"],
+        "pressure": main["pressure"],
+        "description": data["weather"][0]["description"],
+        "wind_speed": data["wind"]["speed"]
+    }
+
+def _format_current(data: Dict[str, Any], units: str) -> str:
+    """Render a /weather response as readable text"""
+    temp = data["main"]["temp"]
+    feels_like = data["main"]["feels_like"]
+    humidity = data["main"]["humidity"]
+    pressure = data["main"]["pressure"]
+    description = data["weather"][0]["description"]
+    wind_speed = data["wind"]["speed"]
+    
+    unit_symbol, wind_unit = _UNIT_TABLE.get(units, _UNIT_TABLE["kelvin"])
+    
+    return f"""Current Weather for {data['name']}, {data['sys']['country']}:
         
 🌡️ Temperature: {temp}{unit_symbol} (feels like {feels_like}{unit_symbol})
 ☁️ Conditions: {description.title()}
 💧 Humidity: {humidity}%
-🌪️ Wind Speed: {wind_speed} {'m/s' if units == 'metric' else 'mph'}
+🌪️ Wind Speed: {wind_speed} {wind_unit}
 📊 Pressure: {pressure} hPa
 """
-        
-        return weather_info
 
-async def get_weather_forecast(location: str, units: str = "metric") -> str:
+async def get_weather_forecast(location: str, units: str = "metric", format: str = "pretty") -> str:
     """Get 5-day weather forecast for a location"""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{BASE_URL}/forecast",
-            params={
-                "q": location,
-                "appid": API_KEY,
-                "units": units
-            }
-        )
-        
-        if response.status_code != 200:
-            return f"Error: Could not get forecast for {location}. Status: {response.status_code}"
-        
-        data = response.json()
-        
-        unit_symbol = "°C" if units == "metric" else "°F" if units == "imperial" else "K"
-        
-        forecast_info = f"5-Day Weather Forecast for {data['city']['name']}, {data['city']['country']}:\n\n"
-        
-        daily_forecasts = {}
-        for item in data["list"]:
-            date = item["dt_txt"].split()[0] 
-            if date not in daily_forecasts:
-                daily_forecasts[date] = []
-            daily_forecasts[date].append(item)
+    query = location.strip().lower()
+    status, data = await _forecast_data(query, units)
+    if data is None:
+        return f"Error: Could not get forecast for {location}. Status: {status}"
+    
+    if format == "json":
+        return _dumps(_forecast_summary(data, units)).decode()
+    return _format_forecast(data, units)
+
+async def _forecast_data(location: str, units: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """Return (status, parsed /forecast response) for a normalized location"""
+    cache_key = ("forecast", location, units)
+    data = _cache_get(cache_key, ttl=3600)
+    if data is not None:
+        return 200, data
+    return await single_flight(_inflight, cache_key, lambda: _fetch_json(
+        "/forecast",
+        {
+            "q": location,
+            "appid": API_KEY,
+            "units": units
+        },
+        cache_key
+    ))
+
+def _forecast_days(data: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Summarize a /forecast response as (date, day) for the first five days"""
+    # One pass per item: track each day's temperature range and the
+    # forecast closest to midday (12:00)
+    daily: Dict[str, Dict[str, Any]] = {}
+    for item in data["list"]:
+        date = item["dt_txt"][:10]
+        # dt_txt is dt rendered in UTC, so the hour comes from the integer
+        # timestamp instead of parsing it out of the string
+        distance = abs(12 - item["dt"] // 3600 % 24)
+        main = item["main"]
         
-        for date, forecasts in list(daily_forecasts.items())[:5]:
-            midday_forecast = min(forecasts, key=lambda x: abs(12 - int(x["dt_txt"].split()[1].split(":")[0])))
-            
-            temp = midday_forecast["main"]["temp"]
-            temp_min = min(f["main"]["temp_min"] for f in forecasts)
-            temp_max = max(f["main"]["temp_max"] for f in forecasts)
-            description = midday_forecast["weather"][0]["description"]
-            
-            forecast_info += f"📅 {date}: {description.title()}\n"
-            forecast_info += f"   🌡️ {temp_min}{unit_symbol} - {temp_max}{unit_symbol}\n\n"
+        day = daily.get(date)
+        if day is None:
+            daily[date] = {
+                "tmin": main["temp_min"],
+                "tmax": main["temp_max"],
+                "midday": item,
+                "best_dist": distance
+            }
+            continue
+        if main["temp_min"] < day["tmin"]:
+            day["tmin"] = main["temp_min"]
+        if main["temp_max"] > day["tmax"]:
+            day["tmax"] = main["temp_max"]
+        if distance < day["best_dist"]:
+            day["midday"] = item
+            day["best_dist"] = distance
+    
+    return list(islice(daily.items(), 5))
+
+def _forecast_summary(data: Dict[str, Any], units: str) -> Dict[str, Any]:
+    """Just the values of a /forecast response, for JSON output"""
+    return {
+        "location": data["city"]["name"],
+        "country": data["city"]["country"],
+        "units": units,
+        "days": [
+            {
+                "date": date,
+                "description": day["midday"]["weather"][0]["description"],
+                "temp_min": day["tmin"],
+                "temp_max": day["tmax"]
+            }
+            for date, day in _forecast_days(data)
+        ]
+    }
+
+def _format_forecast(data: Dict[str, Any], units: str) -> str:
+    """Render a /forecast response as readable text"""
+    unit_symbol = _UNIT_TABLE.get(units, _UNIT_TABLE["kelvin"])[0]
+    
+    parts = [f"5-Day Weather Forecast for {data['city']['name']}, {data['city']['country']}:\n\n"]
+    for date, day in _forecast_days(data):
+        temp_min = day["tmin"]
+        temp_max = day["tmax"]
+        description = day["midday"]["weather"][0]["description"]
         
-        return forecast_info
+        parts.append(f"📅 {date}: {description.title()}\n")
+        parts.append(f"   🌡️ {temp_min}{unit_symbol} - {temp_max}{unit_symbol}\n\n")
+    
+    return "".join(parts)
+
+async def get_weather_overview(location: str, units: str = "metric", format: str = "pretty") -> str:
+    """Get current weather and the forecast for a location"""
+    if format != "json":
+        # Both requests are in flight at once, so this costs about one round trip
+        current, forecast = await asyncio.gather(
+            get_current_weather(location, units, format),
+            get_weather_forecast(location, units, format)
+        )
+        return f"{current}\n{forecast}"
+    
+    # One JSON document, with an error object in place of a lookup that failed
+    query = location.strip().lower()
+    (current_status, current), (forecast_status, forecast) = await asyncio.gather(
+        _current_data(query, units),
+        _forecast_data(query, units)
+    )
+    return _dumps({
+        "current": (
+            _current_summary(current, units) if current is not None
+            else {"error": f"Could not get weather for {location}", "status": current_status}
+        ),
+        "forecast": (
+            _forecast_summary(forecast, units) if forecast is not None
+            else {"error": f"Could not get forecast for {location}", "status": forecast_status}
+        )
+    }).decode()
+
+# Tool name -> implementation, looked up by call_tool
+_HANDLERS: Dict[str, Callable[..., Awaitable[str]]] = {
+    "get_current_weather": get_current_weather,
+    "get_weather_forecast": get_weather_forecast,
+    "get_weather_overview": get_weather_overview
+}
 
 async def main():
     """Main entry point"""
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="weather-server",
-                server_version="1.0.0",
-                capabilities=app.get_capabilities()
+    # API_KEY is read once at import, so check it at startup, not per tool call
+    if not API_KEY:
+        print("Error: OpenWeatherMap API key not configured. Please set OPENWEATHER_API_KEY environment variable.", file=sys.stderr)
+        sys.exit(2)
+    
+    _get_client()
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="weather-server",
+                    server_version="1.0.0",
+                    capabilities=app.get_capabilities()
+                )
             )
-        )
+    finally:
+        await _client.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if uvloop is None:
+        asyncio.run(main())
+    elif sys.version_info >= (3, 12):
+        asyncio.run(main(), loop_factory=uvloop.new_event_loop)
+    else:
+        uvloop.install()
+        asyncio.run(main())
\ No newline at end of file
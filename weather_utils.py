@@ -0,0 +1,29 @@
+"""
+Small helpers shared by the MCP weather servers; kept free of heavy imports
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+# JSON helpers: bytes in, bytes out, orjson when installed
+try:
+    import orjson
+    loads = orjson.loads
+    dumps = orjson.dumps
+except ImportError:  # Fall back to the stdlib encoder
+    loads = json.loads
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+async def single_flight(pending: Dict[Any, asyncio.Task], key: Any,
+                        fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fetch() once per key in pending, sharing the result with concurrent callers"""
+    task = pending.get(key)
+    if task is None:
+        task = asyncio.create_task(fetch())
+        pending[key] = task
+        task.add_done_callback(lambda _: pending.pop(key, None))
+    # Shielded so one caller giving up doesn't cancel the fetch for the others
+    return await asyncio.shield(task)